@@ -7,3 +7,18 @@ from django.conf import settings
 
 
 EXAMPLE_SETTING_ONE = getattr(settings, "EXAMPLE_SETTING_ONE", None)
+
+# Maximum number of journal entries shown in the drilldown modal
+FINANCES_DRILLDOWN_MAX_ROWS = getattr(settings, "FINANCES_DRILLDOWN_MAX_ROWS", 5000)
+
+# Seconds the journal aggregates of the dashboard are cached for
+FINANCES_CACHE_TIMEOUT = getattr(settings, "FINANCES_CACHE_TIMEOUT", 900)
+
+# Seconds a user's rendered dashboard aggregates are cached for
+FINANCES_DASHBOARD_CACHE_TIMEOUT = getattr(settings, "FINANCES_DASHBOARD_CACHE_TIMEOUT", 60)
+
+# Closed days update_daily_totals rebuilds on every run, to pick up journal
+# entries corptools imported late. ESI returns 30 days of wallet journal.
+FINANCES_DAILY_TOTALS_REBUILD_DAYS = getattr(
+    settings, "FINANCES_DAILY_TOTALS_REBUILD_DAYS", 30
+)
@@ -13,3 +13,9 @@ class FinancesConfig(AppConfig):
     name = "finances"
     label = "finances"
     verbose_name = f"Finances v{__version__}"
+
+    def ready(self):
+        """Connect the app signals"""
+
+        # AA allianceauth-corptools-finances
+        from finances import signals  # noqa: F401 pylint: disable=unused-import
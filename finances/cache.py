@@ -0,0 +1,42 @@
+"""Cache helpers"""
+
+# Standard Library
+import hashlib
+
+# Django
+from django.core.cache import cache
+
+JOURNAL_VERSION_KEY = "finances:journal-version:{division_id}"
+
+
+def get_journal_versions(division_ids) -> list:
+    """Return the current journal version of each wallet division"""
+
+    keys = [JOURNAL_VERSION_KEY.format(division_id=division_id) for division_id in division_ids]
+    versions = cache.get_many(keys)
+
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_journal_version(division_id) -> None:
+    """Invalidate cached journal data of a wallet division"""
+
+    key = JOURNAL_VERSION_KEY.format(division_id=division_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The key was evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def make_digest(*parts) -> str:
+    """Hash arbitrary parts into a fixed length string"""
+
+    return hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def make_cache_key(prefix: str, *parts) -> str:
+    """Build a fixed length cache key from arbitrary parts"""
+
+    return f"finances:{prefix}:{make_digest(*parts)}"
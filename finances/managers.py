@@ -0,0 +1,77 @@
+"""App Managers"""
+
+# Standard Library
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+# Django
+from django.db import models, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+# Corptools
+from corptools.models import CorporationWalletJournalEntry
+
+INSERT_BATCH_SIZE = 1000
+
+DAILY_TOTAL_FIELDS = ("income", "expenses", "income_count", "expense_count", "entry_count")
+
+
+class CorporationWalletDailyTotalManager(models.Manager):
+    """Manager for CorporationWalletDailyTotal"""
+
+    def journal_totals(self, entries):
+        """Group journal entries into the same rows the daily totals store"""
+
+        return (
+            entries.annotate(day=TruncDate("date"))
+            .values("day", "division_id", "ref_type")
+            .annotate(
+                income=Coalesce(Sum("amount", filter=Q(amount__gt=0)), Decimal("0.00")),
+                expenses=Coalesce(Sum("amount", filter=Q(amount__lt=0)), Decimal("0.00")),
+                income_count=Count("id", filter=Q(amount__gt=0)),
+                expense_count=Count("id", filter=Q(amount__lt=0)),
+                entry_count=Count("id"),
+            )
+            .order_by()
+        )
+
+    def update_from_journal(self, start_day, end_day, last_entry_id=None) -> int:
+        """Replace the daily totals of start_day through end_day, up to journal id last_entry_id"""
+
+        # Days are bucketed in the current timezone, like TruncDate does
+        tz = timezone.get_current_timezone()
+        entries = CorporationWalletJournalEntry.objects.filter(
+            date__gte=timezone.make_aware(datetime.combine(start_day, time.min), tz),
+            date__lt=timezone.make_aware(
+                datetime.combine(end_day + timedelta(days=1), time.min), tz
+            ),
+        )
+        if last_entry_id is not None:
+            entries = entries.filter(id__lte=last_entry_id)
+
+        count = 0
+        with transaction.atomic(using=self.db):
+            # Rows of entries or divisions that are gone since the last
+            # run would never be overwritten, so the window is replaced
+            self.filter(date__gte=start_day, date__lte=end_day).delete()
+
+            # Insert chunk by chunk, a full journal backfill never sits in memory
+            rows = self.journal_totals(entries).iterator(chunk_size=INSERT_BATCH_SIZE)
+            while batch := list(islice(rows, INSERT_BATCH_SIZE)):
+                self.bulk_create(
+                    [
+                        self.model(
+                            date=row["day"],
+                            division_id=row["division_id"],
+                            ref_type=row["ref_type"],
+                            **{field: row[field] for field in DAILY_TOTAL_FIELDS},
+                        )
+                        for row in batch
+                    ]
+                )
+                count += len(batch)
+
+        return count
@@ -0,0 +1,63 @@
+# Django
+from django.db import migrations
+
+JOURNAL_TABLE = "corptools_corporationwalletjournalentry"
+INDEX_NAME = "idx_cwj_div_date_ref"
+
+
+def _index_exists(schema_editor) -> bool:
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if JOURNAL_TABLE not in connection.introspection.table_names(cursor):
+            return False
+        return INDEX_NAME in connection.introspection.get_constraints(
+            cursor, JOURNAL_TABLE
+        )
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if _index_exists(schema_editor):
+        return
+
+    if connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY {INDEX_NAME} ON {JOURNAL_TABLE} "
+            "(division_id, date DESC, ref_type) INCLUDE (amount)"
+        )
+    else:
+        schema_editor.execute(
+            f"CREATE INDEX {INDEX_NAME} ON {JOURNAL_TABLE} "
+            "(division_id, date DESC, ref_type, amount)"
+        )
+
+
+def drop_index(apps, schema_editor):
+    if not _index_exists(schema_editor):
+        return
+
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY {INDEX_NAME}")
+    elif connection.vendor == "mysql":
+        schema_editor.execute(f"DROP INDEX {INDEX_NAME} ON {JOURNAL_TABLE}")
+    else:
+        schema_editor.execute(f"DROP INDEX {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("finances", "0001_initial"),
+        # Creates CorporationWalletJournalEntry
+        (
+            "corptools",
+            "0011_characterwalletjournalentry_corporationwalletdivision_corporationwalletjournalentry",
+        ),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,61 @@
+# Django
+from django.db import migrations
+
+JOURNAL_TABLE = "corptools_corporationwalletjournalentry"
+PARTIAL_INDEXES = {
+    "idx_cwj_income_div_date_ref": "amount > 0",
+    "idx_cwj_expense_div_date_ref": "amount < 0",
+}
+
+
+def _existing_indexes(schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        return set(connection.introspection.get_constraints(cursor, JOURNAL_TABLE))
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    # MySQL/MariaDB have no partial indexes, idx_cwj_div_date_ref covers them
+    if connection.vendor not in ("postgresql", "sqlite"):
+        return
+
+    existing = _existing_indexes(schema_editor)
+    for name, condition in PARTIAL_INDEXES.items():
+        if name in existing:
+            continue
+        if connection.vendor == "postgresql":
+            schema_editor.execute(
+                f"CREATE INDEX CONCURRENTLY {name} ON {JOURNAL_TABLE} "
+                f"(division_id, date DESC, ref_type) INCLUDE (amount) WHERE {condition}"
+            )
+        else:
+            schema_editor.execute(
+                f"CREATE INDEX {name} ON {JOURNAL_TABLE} "
+                f"(division_id, date DESC, ref_type, amount) WHERE {condition}"
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    existing = _existing_indexes(schema_editor)
+    connection = schema_editor.connection
+    for name in PARTIAL_INDEXES:
+        if name not in existing:
+            continue
+        if connection.vendor == "postgresql":
+            schema_editor.execute(f"DROP INDEX CONCURRENTLY {name}")
+        else:
+            schema_editor.execute(f"DROP INDEX {name}")
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ("finances", "0002_journal_dashboard_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
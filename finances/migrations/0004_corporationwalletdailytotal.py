@@ -0,0 +1,49 @@
+# Django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("finances", "0003_journal_sign_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CorporationWalletDailyTotal",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("division_id", models.PositiveIntegerField()),
+                ("ref_type", models.CharField(max_length=72)),
+                (
+                    "income",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+                (
+                    "expenses",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=20),
+                ),
+                ("income_count", models.PositiveIntegerField(default=0)),
+                ("expense_count", models.PositiveIntegerField(default=0)),
+                ("entry_count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "default_permissions": (),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="corporationwalletdailytotal",
+            constraint=models.UniqueConstraint(
+                fields=("date", "division_id", "ref_type"),
+                name="finances_daily_total_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("finances", "0004_corporationwalletdailytotal"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CorporationWalletDailyTotalState",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("synced_through", models.DateField()),
+                ("last_entry_id", models.BigIntegerField()),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "default_permissions": (),
+            },
+        ),
+    ]
@@ -6,6 +6,9 @@ Create your models in here
 # Django
 from django.db import models
 
+# AA allianceauth-corptools-finances
+from finances.managers import CorporationWalletDailyTotalManager
+
 
 class General(models.Model):
     """Meta model for app permissions"""
@@ -16,3 +19,53 @@ class General(models.Model):
         managed = False
         default_permissions = ()
         permissions = (("basic_access", "Can access this app"),)
+
+
+class CorporationWalletDailyTotal(models.Model):
+    """Journal totals of a wallet division per day and ref type"""
+
+    date = models.DateField()
+    # Plain id instead of a foreign key, the dashboard only ever filters
+    # by divisions it already resolved through corptools
+    division_id = models.PositiveIntegerField()
+    ref_type = models.CharField(max_length=72)
+    income = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    income_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+
+    objects = CorporationWalletDailyTotalManager()
+
+    class Meta:
+        """Meta definitions"""
+
+        default_permissions = ()
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "division_id", "ref_type"],
+                name="finances_daily_total_unique",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.division_id} {self.ref_type}"
+
+
+class CorporationWalletDailyTotalState(models.Model):
+    """How far update_daily_totals has folded the journal into the daily totals"""
+
+    # Last day stored in the daily totals
+    synced_through = models.DateField()
+    # Highest journal id the daily totals cover, anything above it is read live
+    last_entry_id = models.BigIntegerField()
+    # Moves on every run, the dashboard keys its caches on it
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        """Meta definitions"""
+
+        default_permissions = ()
+
+    def __str__(self):
+        return f"{self.synced_through} {self.last_entry_id}"
@@ -0,0 +1,21 @@
+"""App Signals"""
+
+# Django
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+# Corptools
+from corptools.models import CorporationWalletJournalEntry
+
+# AA allianceauth-corptools-finances
+from finances.cache import bump_journal_version
+
+
+# No post_delete receiver: it would disable Django's fast delete and load
+# every journal row when a corporation is removed. Deleted divisions drop
+# out of the cache keys with the division ids already.
+@receiver(post_save, sender=CorporationWalletJournalEntry)
+def journal_entry_changed(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Invalidate cached dashboard data when a journal entry is edited"""
+
+    bump_journal_version(instance.division_id)
@@ -2,10 +2,23 @@
 
 # Standard Library
 import logging
+from datetime import timedelta
 
 # Third Party
 from celery import shared_task
 
+# Django
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+# Corptools
+from corptools.models import CorporationWalletDivision, CorporationWalletJournalEntry
+
+# AA allianceauth-corptools-finances
+from finances.app_settings import FINANCES_DAILY_TOTALS_REBUILD_DAYS
+from finances.models import CorporationWalletDailyTotal, CorporationWalletDailyTotalState
+
 logger = logging.getLogger(__name__)
 
 # Create your tasks here
@@ -17,3 +30,42 @@ def example_task():
     """Example Task"""
 
     pass
+
+
+@shared_task
+def update_daily_totals():
+    """Rebuild the daily journal totals of the recently closed days"""
+
+    yesterday = timezone.localdate() - timedelta(days=1)
+    start_day = yesterday - timedelta(days=FINANCES_DAILY_TOTALS_REBUILD_DAYS - 1)
+
+    # Entries imported while the task runs stay above the watermark and are read live
+    last_entry_id = CorporationWalletJournalEntry.objects.aggregate(last_id=Max("id"))["last_id"]
+    if last_entry_id is None:
+        return
+
+    new_entries = CorporationWalletJournalEntry.objects.filter(id__lte=last_entry_id)
+    state = CorporationWalletDailyTotalState.objects.filter(pk=1).first()
+    if state is not None:
+        new_entries = new_entries.filter(id__gt=state.last_entry_id)
+        # Close the gap if the task has not run for a while
+        start_day = min(start_day, state.synced_through + timedelta(days=1))
+
+    # Rebuild every day that got entries since the last run, late imports for
+    # older days included. The first run backfills the whole journal this way
+    first_new = new_entries.aggregate(first=Min("date"))["first"]
+    if first_new is not None:
+        start_day = min(start_day, timezone.localdate(first_new))
+
+    with transaction.atomic():
+        count = CorporationWalletDailyTotal.objects.update_from_journal(start_day, yesterday, last_entry_id)
+        # Divisions corptools dropped leave their rows outside the window too
+        CorporationWalletDailyTotal.objects.exclude(
+            division_id__in=CorporationWalletDivision.objects.values("id")
+        ).delete()
+        CorporationWalletDailyTotalState.objects.update_or_create(
+            pk=1,
+            defaults={"synced_through": yesterday, "last_entry_id": last_entry_id},
+        )
+
+    logger.info("Updated %s daily wallet totals from %s to %s", count, start_day, yesterday)
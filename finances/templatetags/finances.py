@@ -0,0 +1,17 @@
+"""Template filters for the finances dashboard"""
+
+# Standard Library
+from functools import lru_cache
+
+# Django
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+@lru_cache(maxsize=2048)
+def ref_type_label(ref_type: str) -> str:
+    """Turn a wallet journal ref type into a readable label"""
+
+    return ref_type.replace("_", " ").title()
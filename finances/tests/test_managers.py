@@ -0,0 +1,131 @@
+"""
+Test the managers
+"""
+
+# Standard Library
+from datetime import timedelta
+from decimal import Decimal
+
+# Django
+from django.test import TestCase
+from django.utils import timezone
+
+# Corptools
+from corptools.models import CorporationWalletJournalEntry
+
+# AA allianceauth-corptools-finances
+from finances.models import CorporationWalletDailyTotal
+from finances.tests.utils import create_journal_entry, create_wallet_division, noon_of
+
+
+class TestUpdateFromJournal(TestCase):
+    """
+    Test CorporationWalletDailyTotal.objects.update_from_journal
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """
+        Test setup
+        :return:
+        :rtype:
+        """
+
+        cls.day = timezone.localdate() - timedelta(days=1)
+        cls.division = create_wallet_division()
+        create_journal_entry(cls.division, noon_of(cls.day), "100.00")
+        create_journal_entry(cls.division, noon_of(cls.day), "50.00")
+        create_journal_entry(cls.division, noon_of(cls.day), "-30.00", "market_escrow")
+
+    def _totals(self) -> dict:
+        return {
+            total.ref_type: total
+            for total in CorporationWalletDailyTotal.objects.filter(date=self.day)
+        }
+
+    def test_should_store_daily_totals_per_ref_type(self):
+        """
+        Test the stored totals of one day
+        :return:
+        :rtype:
+        """
+
+        count = CorporationWalletDailyTotal.objects.update_from_journal(self.day, self.day)
+
+        totals = self._totals()
+        self.assertEqual(count, 2)
+        self.assertEqual(set(totals), {"bounty_prizes", "market_escrow"})
+        self.assertEqual(totals["bounty_prizes"].income, Decimal("150.00"))
+        self.assertEqual(totals["bounty_prizes"].income_count, 2)
+        self.assertEqual(totals["market_escrow"].expenses, Decimal("-30.00"))
+        self.assertEqual(totals["market_escrow"].expense_count, 1)
+
+    def test_should_be_idempotent(self):
+        """
+        Test that a re-run with an unchanged journal stores the same totals
+        :return:
+        :rtype:
+        """
+
+        CorporationWalletDailyTotal.objects.update_from_journal(self.day, self.day)
+        first_run = {
+            ref_type: (total.income, total.expenses, total.entry_count)
+            for ref_type, total in self._totals().items()
+        }
+
+        CorporationWalletDailyTotal.objects.update_from_journal(self.day, self.day)
+        second_run = {
+            ref_type: (total.income, total.expenses, total.entry_count)
+            for ref_type, total in self._totals().items()
+        }
+
+        self.assertEqual(CorporationWalletDailyTotal.objects.count(), 2)
+        self.assertEqual(first_run, second_run)
+
+    def test_should_replace_the_totals_of_late_journal_entries(self):
+        """
+        Test that a re-run replaces the existing row of a day
+        :return:
+        :rtype:
+        """
+
+        CorporationWalletDailyTotal.objects.update_from_journal(self.day, self.day)
+        create_journal_entry(self.division, noon_of(self.day), "25.00")
+
+        CorporationWalletDailyTotal.objects.update_from_journal(self.day, self.day)
+
+        totals = self._totals()
+        self.assertEqual(CorporationWalletDailyTotal.objects.count(), 2)
+        self.assertEqual(totals["bounty_prizes"].income, Decimal("175.00"))
+        self.assertEqual(totals["bounty_prizes"].income_count, 3)
+        self.assertEqual(totals["bounty_prizes"].entry_count, 3)
+
+    def test_should_drop_the_rows_of_deleted_entries(self):
+        """
+        Test that a re-run removes a ref type without entries left
+        :return:
+        :rtype:
+        """
+
+        CorporationWalletDailyTotal.objects.update_from_journal(self.day, self.day)
+        CorporationWalletJournalEntry.objects.filter(ref_type="market_escrow").delete()
+
+        CorporationWalletDailyTotal.objects.update_from_journal(self.day, self.day)
+
+        self.assertEqual(set(self._totals()), {"bounty_prizes"})
+
+    def test_should_skip_entries_above_the_last_entry_id(self):
+        """
+        Test that entries above last_entry_id stay out of the totals
+        :return:
+        :rtype:
+        """
+
+        last_entry_id = CorporationWalletJournalEntry.objects.latest("id").id
+        create_journal_entry(self.division, noon_of(self.day), "25.00")
+
+        CorporationWalletDailyTotal.objects.update_from_journal(self.day, self.day, last_entry_id)
+
+        totals = self._totals()
+        self.assertEqual(totals["bounty_prizes"].income, Decimal("150.00"))
+        self.assertEqual(totals["bounty_prizes"].income_count, 2)
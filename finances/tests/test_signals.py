@@ -0,0 +1,41 @@
+"""
+Test the signals
+"""
+
+# Django
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+# AA allianceauth-corptools-finances
+from finances.tests.utils import create_journal_entry, create_wallet_division
+
+
+class TestJournalSignals(TestCase):
+    """
+    Test the journal signal receivers
+    """
+
+    def test_should_keep_fast_deleting_the_journal(self):
+        """
+        Test that deleting a division removes its journal with one DELETE,
+        a post_delete receiver on the journal would load every row first
+        :return:
+        :rtype:
+        """
+
+        division = create_wallet_division()
+        for _ in range(3):
+            create_journal_entry(division, timezone.now(), "100.00")
+
+        with CaptureQueriesContext(connection) as queries:
+            division.delete()
+
+        journal_selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+            and "corptools_corporationwalletjournalentry" in query["sql"]
+        ]
+        self.assertEqual(journal_selects, [])
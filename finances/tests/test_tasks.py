@@ -0,0 +1,104 @@
+"""
+Test the tasks
+"""
+
+# Standard Library
+from datetime import timedelta
+from decimal import Decimal
+
+# Django
+from django.test import TestCase
+from django.utils import timezone
+
+# Corptools
+from corptools.models import CorporationWalletJournalEntry
+
+# AA allianceauth-corptools-finances
+from finances.models import CorporationWalletDailyTotal, CorporationWalletDailyTotalState
+from finances.tasks import update_daily_totals
+from finances.tests.utils import create_journal_entry, create_wallet_division, noon_of
+
+
+class TestUpdateDailyTotals(TestCase):
+    """
+    Test the update_daily_totals task
+    """
+
+    def test_should_backfill_the_whole_journal_on_the_first_run(self):
+        """
+        Test that the first run covers entries older than the rebuild window
+        :return:
+        :rtype:
+        """
+
+        today = timezone.localdate()
+        division = create_wallet_division()
+        create_journal_entry(division, noon_of(today - timedelta(days=100)), "100.00")
+        create_journal_entry(division, noon_of(today - timedelta(days=1)), "50.00")
+        create_journal_entry(division, timezone.now(), "25.00")
+
+        update_daily_totals()
+
+        totals = dict(CorporationWalletDailyTotal.objects.values_list("date", "income"))
+        self.assertEqual(
+            totals,
+            {
+                today - timedelta(days=100): Decimal("100.00"),
+                today - timedelta(days=1): Decimal("50.00"),
+            },
+        )
+
+    def test_should_do_nothing_without_journal(self):
+        """
+        Test the first run on an empty journal
+        :return:
+        :rtype:
+        """
+
+        update_daily_totals()
+
+        self.assertFalse(CorporationWalletDailyTotal.objects.exists())
+
+    def test_should_rebuild_the_day_of_late_imports(self):
+        """
+        Test that an entry imported for a day before the rebuild window is stored
+        :return:
+        :rtype:
+        """
+
+        old_day = timezone.localdate() - timedelta(days=100)
+        division = create_wallet_division()
+        create_journal_entry(division, noon_of(old_day), "100.00")
+        update_daily_totals()
+        create_journal_entry(division, noon_of(old_day), "50.00")
+
+        update_daily_totals()
+
+        total = CorporationWalletDailyTotal.objects.get(date=old_day)
+        self.assertEqual(total.income, Decimal("150.00"))
+        self.assertEqual(
+            CorporationWalletDailyTotalState.objects.get().last_entry_id,
+            CorporationWalletJournalEntry.objects.latest("id").id,
+        )
+
+    def test_should_drop_the_totals_of_deleted_divisions(self):
+        """
+        Test that rows of a deleted division go, also outside the rebuild window
+        :return:
+        :rtype:
+        """
+
+        old_day = timezone.localdate() - timedelta(days=100)
+        division = create_wallet_division()
+        other_division = create_wallet_division(division=2)
+        create_journal_entry(division, noon_of(old_day), "100.00")
+        create_journal_entry(other_division, noon_of(old_day), "50.00")
+        update_daily_totals()
+
+        other_division.delete()
+        update_daily_totals()
+
+        self.assertEqual(
+            list(CorporationWalletDailyTotal.objects.values_list("division_id", flat=True)),
+            [division.pk],
+        )
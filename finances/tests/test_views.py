@@ -0,0 +1,541 @@
+"""
+Test the views
+"""
+
+# Standard Library
+import csv
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+# Django
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+# Alliance Auth
+from allianceauth.tests.auth_utils import AuthUtils
+
+# Corptools
+from corptools.models import CorporationWalletJournalEntry
+
+# AA allianceauth-corptools-finances
+from finances.models import CorporationWalletDailyTotal, CorporationWalletDailyTotalState
+from finances.tasks import update_daily_totals
+from finances.templatetags.finances import ref_type_label
+from finances.tests.utils import (
+    create_journal_entry,
+    create_user_with_main_character,
+    create_wallet_division,
+    create_wallet_manager,
+    noon_of,
+)
+from finances.views import _journal_buckets, _start_of_day
+
+
+class TestDashboardData(TestCase):
+    """
+    Test the dashboard_data JSON endpoint
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """
+        Test setup
+        :return:
+        :rtype:
+        """
+
+        cls.user = create_wallet_manager()
+        cls.url = reverse("finances:dashboard_data")
+
+    def setUp(self) -> None:
+        """
+        Start every test with an empty dashboard cache
+        :return:
+        :rtype:
+        """
+
+        cache.clear()
+
+    def test_should_deny_users_without_wallet_permissions(self):
+        """
+        Test that users without any corptools wallet permission get a 403
+        :return:
+        :rtype:
+        """
+
+        self.client.force_login(create_user_with_main_character("no_wallets", 1002))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_should_return_empty_series_without_divisions(self):
+        """
+        Test the payload when no wallet division is visible
+        :return:
+        :rtype:
+        """
+
+        self.client.force_login(self.user)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "income_series": [],
+                "income_series_by_ref": [],
+                "expense_series": [],
+                "expense_series_by_ref": [],
+            },
+        )
+
+    def test_should_answer_matching_etag_with_not_modified(self):
+        """
+        Test that a repeated request with the ETag gets a 304
+        :return:
+        :rtype:
+        """
+
+        division = create_wallet_division()
+        create_journal_entry(division, timezone.now() - timedelta(days=1), "100.00")
+        self.client.force_login(self.user)
+
+        response = self.client.get(self.url)
+        etag = response.headers["ETag"]
+        response_cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_cached.status_code, 304)
+
+    def test_should_clamp_custom_range_starting_in_the_future(self):
+        """
+        Test that a custom range after today falls back to today
+        :return:
+        :rtype:
+        """
+
+        division = create_wallet_division()
+        create_journal_entry(division, timezone.now(), "100.00")
+        self.client.force_login(self.user)
+
+        response = self.client.get(self.url, {"start_date": "2099-01-01"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["income_series"]), 1)
+
+
+class TestDashboard(TestCase):
+    """
+    Test the dashboard page
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """
+        Test setup
+        :return:
+        :rtype:
+        """
+
+        cls.user = create_wallet_manager()
+        cls.url = reverse("finances:dashboard")
+        cls.division = create_wallet_division()
+        create_journal_entry(cls.division, timezone.now() - timedelta(days=1), "100.00")
+
+    def setUp(self) -> None:
+        """
+        Start every test with an empty dashboard cache
+        :return:
+        :rtype:
+        """
+
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_should_not_serve_yesterdays_cached_window(self):
+        """
+        Test that the cached context moves on with the day
+        :return:
+        :rtype:
+        """
+
+        now = timezone.now()
+        self.client.get(self.url)
+
+        with patch("django.utils.timezone.now", return_value=now + timedelta(days=1)):
+            response = self.client.get(self.url)
+
+        tomorrow = timezone.localdate(now + timedelta(days=1))
+        self.assertEqual(response.context["end_date"].date(), tomorrow)
+        self.assertEqual(response.context["income_series"][-1]["date"], tomorrow.isoformat())
+
+    def test_should_count_late_imports_in_every_total(self):
+        """
+        Test that an entry imported after the task run reaches the summary,
+        the series and the division totals alike
+        :return:
+        :rtype:
+        """
+
+        update_daily_totals()
+        self.client.get(self.url)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        create_journal_entry(self.division, noon_of(yesterday), "50.00")
+
+        response = self.client.get(self.url)
+
+        context = response.context
+        self.assertEqual(context["summary"]["income_total"], Decimal("150.00"))
+        self.assertEqual(sum(point["total"] for point in context["income_series"]), 150)
+        self.assertEqual(context["division_rows"][0]["income"], Decimal("150.00"))
+
+    def test_should_change_the_etag_when_the_task_rewrites_totals(self):
+        """
+        Test that a task run without a new journal id still invalidates the page
+        :return:
+        :rtype:
+        """
+
+        entry = create_journal_entry(
+            self.division, timezone.now() - timedelta(days=2), "20.00"
+        )
+        create_journal_entry(self.division, timezone.now() - timedelta(days=1), "30.00")
+        update_daily_totals()
+        etag = self.client.get(self.url).headers["ETag"]
+
+        # A queryset delete leaves the highest id and the versions alone
+        CorporationWalletJournalEntry.objects.filter(pk=entry.pk).delete()
+        update_daily_totals()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["summary"]["income_total"], Decimal("130.00"))
+
+
+class TestDashboardContent(TestCase):
+    """
+    Test the totals, tables and drilldowns of the dashboard page
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """
+        Six entries of yesterday in one division, a second division stays idle
+        :return:
+        :rtype:
+        """
+
+        cls.user = create_wallet_manager()
+        cls.url = reverse("finances:dashboard")
+        cls.division = create_wallet_division()
+        cls.idle_division = create_wallet_division(division=2)
+        yesterday = noon_of(timezone.localdate() - timedelta(days=1))
+        for amount, ref_type, description in (
+            ("100.00", "bounty_prizes", "note-bounty-1"),
+            ("50.00", "bounty_prizes", "note-bounty-2"),
+            ("300.00", "player_donation", "note-donation"),
+            ("-30.00", "market_escrow", "note-escrow"),
+            ("-5.00", "brokers_fee", "note-broker-fee"),
+            ("0.00", "bounty_prizes", "note-zero"),
+        ):
+            create_journal_entry(cls.division, yesterday, amount, ref_type, description)
+
+    def setUp(self) -> None:
+        """
+        Start every test with an empty dashboard cache
+        :return:
+        :rtype:
+        """
+
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_should_sum_the_summary(self):
+        """
+        Test the summary totals and counts, zero amounts only count as entries
+        :return:
+        :rtype:
+        """
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context["summary"],
+            {
+                "income_total": Decimal("450.00"),
+                "expense_total": Decimal("-35.00"),
+                "expense_total_abs": Decimal("35.00"),
+                "net_total": Decimal("415.00"),
+                "entry_count": 6,
+                "income_count": 3,
+                "expense_count": 2,
+            },
+        )
+
+    def test_should_order_the_ref_type_tables_by_total(self):
+        """
+        Test the per ref type tables, largest income and largest expense first
+        :return:
+        :rtype:
+        """
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(
+            [(row["ref_type"], row["total"], row["count"]) for row in response.context["income_by_ref"]],
+            [("player_donation", Decimal("300.00"), 1), ("bounty_prizes", Decimal("150.00"), 2)],
+        )
+        self.assertEqual(
+            [(row["ref_type"], row["total"], row["count"]) for row in response.context["expense_by_ref"]],
+            [("market_escrow", Decimal("-30.00"), 1), ("brokers_fee", Decimal("-5.00"), 1)],
+        )
+
+    def test_should_list_idle_divisions(self):
+        """
+        Test the division table, divisions without entries keep zero totals
+        :return:
+        :rtype:
+        """
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(
+            [
+                (row["division_id"], row["income"], row["expenses"], row["net"])
+                for row in response.context["division_rows"]
+            ],
+            [
+                (self.division.pk, Decimal("450.00"), Decimal("-35.00"), Decimal("415.00")),
+                (self.idle_division.pk, Decimal("0.00"), Decimal("0.00"), Decimal("0.00")),
+            ],
+        )
+
+    def test_should_drill_into_an_income_ref_type(self):
+        """
+        Test the income drilldown of one ref type
+        :return:
+        :rtype:
+        """
+
+        response = self.client.get(self.url, {"drill": "income_ref", "ref_type": "bounty_prizes"})
+
+        drilldown = response.context["drilldown"]
+        self.assertEqual(drilldown["title"], f"Income: {ref_type_label('bounty_prizes')}")
+        self.assertEqual(drilldown["count"], 2)
+        self.assertContains(response, "note-bounty-1")
+        self.assertContains(response, "note-bounty-2")
+        self.assertNotContains(response, "note-zero")
+        self.assertNotContains(response, "note-donation")
+
+    def test_should_drill_into_an_expense_ref_type(self):
+        """
+        Test the expense drilldown of one ref type
+        :return:
+        :rtype:
+        """
+
+        response = self.client.get(self.url, {"drill": "expense_ref", "ref_type": "market_escrow"})
+
+        drilldown = response.context["drilldown"]
+        self.assertEqual(drilldown["title"], f"Expenses: {ref_type_label('market_escrow')}")
+        self.assertEqual(drilldown["count"], 1)
+        self.assertContains(response, "note-escrow")
+        self.assertNotContains(response, "note-broker-fee")
+
+    def test_should_drill_into_a_division(self):
+        """
+        Test the division drilldown, without the zero amount entry
+        :return:
+        :rtype:
+        """
+
+        response = self.client.get(self.url, {"drill": "division", "division_id": self.division.pk})
+
+        drilldown = response.context["drilldown"]
+        self.assertEqual(drilldown["title"], "Division: Corporation 2001 - 1")
+        self.assertEqual(drilldown["count"], 5)
+        self.assertNotContains(response, "note-zero")
+
+    def test_should_export_the_drilldown_as_csv(self):
+        """
+        Test the CSV export of a drilldown
+        :return:
+        :rtype:
+        """
+
+        response = self.client.get(
+            self.url, {"drill": "income_ref", "ref_type": "bounty_prizes", "export": "csv"}
+        )
+
+        rows = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(rows[0][:6], ["Date", "Entry ID", "Corporation", "Division", "Ref Type", "Amount"])
+        self.assertEqual(
+            sorted((row[2], row[4], row[5], row[15]) for row in rows[1:]),
+            [
+                ("Corporation 2001", "bounty_prizes", "100.00", "note-bounty-1"),
+                ("Corporation 2001", "bounty_prizes", "50.00", "note-bounty-2"),
+            ],
+        )
+
+    def test_should_cap_the_drilldown_rows(self):
+        """
+        Test that a drilldown above the row limit only renders the latest rows
+        :return:
+        :rtype:
+        """
+
+        with patch("finances.views.FINANCES_DRILLDOWN_MAX_ROWS", 2):
+            response = self.client.get(self.url, {"drill": "division", "division_id": self.division.pk})
+
+        self.assertEqual(response.context["drilldown"]["count"], 5)
+        self.assertContains(response, "showing the latest 2, export the CSV for all entries")
+        rendered = [
+            description
+            for description in ("note-bounty-1", "note-bounty-2", "note-donation", "note-escrow", "note-broker-fee")
+            if description in response.content.decode()
+        ]
+        self.assertEqual(len(rendered), 2)
+
+    def test_should_render_zeros_without_visible_divisions(self):
+        """
+        Test the page of a wallet user who sees no division
+        :return:
+        :rtype:
+        """
+
+        user = create_user_with_main_character("own_corp_manager", 1003)
+        AuthUtils.add_permission_to_user_by_name("corptools.own_corp_manager", user)
+        self.client.force_login(user)
+
+        response = self.client.get(self.url, {"drill": "division", "division_id": self.division.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["division_rows"], [])
+        self.assertEqual(response.context["income_by_ref"], [])
+        self.assertEqual(response.context["summary"]["income_total"], Decimal("0.00"))
+        self.assertEqual(response.context["summary"]["entry_count"], 0)
+        self.assertIsNone(response.context["drilldown"])
+        self.assertNotContains(response, "note-bounty-1")
+
+
+class TestJournalBuckets(TestCase):
+    """
+    Test the split between the daily totals and the live journal
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        """
+        One entry on each of the last four days, the first two synced
+        :return:
+        :rtype:
+        """
+
+        cls.today = timezone.localdate()
+        cls.division = create_wallet_division()
+        for offset in (3, 2, 1):
+            create_journal_entry(
+                cls.division, noon_of(cls.today - timedelta(days=offset)), "100.00"
+            )
+        create_journal_entry(cls.division, timezone.now(), "100.00")
+
+        CorporationWalletDailyTotal.objects.update_from_journal(
+            cls.today - timedelta(days=3), cls.today - timedelta(days=2)
+        )
+        CorporationWalletDailyTotalState.objects.create(
+            synced_through=cls.today - timedelta(days=2),
+            last_entry_id=CorporationWalletJournalEntry.objects.latest("id").id,
+        )
+
+    def _buckets(self, start_day) -> dict:
+        start_date = _start_of_day(start_day)
+        end_date = timezone.localtime()
+        filters = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "division_ids": [self.division.pk],
+            "entries": CorporationWalletJournalEntry.objects.filter(
+                date__gte=start_date,
+                date__lte=end_date,
+                division_id__in=[self.division.pk],
+            ),
+            "journal_state": {
+                "totals": CorporationWalletDailyTotalState.objects.values(
+                    "synced_through", "last_entry_id", "updated"
+                ).first()
+            },
+        }
+
+        # A late entry of a synced day adds a live row next to the stored one
+        income_by_day = {}
+        for row in _journal_buckets(filters):
+            income_by_day[row["day"]] = income_by_day.get(row["day"], 0) + row["income"]
+
+        return income_by_day
+
+    def test_should_count_every_day_once_across_the_boundary(self):
+        """
+        Test a window covering synced and live days
+        :return:
+        :rtype:
+        """
+
+        buckets = self._buckets(self.today - timedelta(days=3))
+
+        self.assertEqual(
+            buckets,
+            {self.today - timedelta(days=offset): Decimal("100.00") for offset in range(4)},
+        )
+
+    def test_should_read_the_journal_after_the_last_synced_day(self):
+        """
+        Test a window starting after the last synced day
+        :return:
+        :rtype:
+        """
+
+        buckets = self._buckets(self.today - timedelta(days=1))
+
+        self.assertEqual(
+            buckets,
+            {self.today - timedelta(days=offset): Decimal("100.00") for offset in range(2)},
+        )
+
+    def test_should_read_the_totals_up_to_the_last_synced_day(self):
+        """
+        Test a window starting on the last synced day
+        :return:
+        :rtype:
+        """
+
+        CorporationWalletJournalEntry.objects.filter(
+            date__lt=_start_of_day(self.today - timedelta(days=1))
+        ).delete()
+
+        buckets = self._buckets(self.today - timedelta(days=2))
+
+        # The synced day still comes from the stored totals
+        self.assertEqual(buckets[self.today - timedelta(days=2)], Decimal("100.00"))
+        self.assertEqual(len(buckets), 3)
+
+    def test_should_read_late_entries_of_synced_days_live(self):
+        """
+        Test that an entry imported after the last run counts on its synced day
+        :return:
+        :rtype:
+        """
+
+        create_journal_entry(self.division, noon_of(self.today - timedelta(days=2)), "50.00")
+
+        buckets = self._buckets(self.today - timedelta(days=3))
+
+        self.assertEqual(buckets[self.today - timedelta(days=3)], Decimal("100.00"))
+        self.assertEqual(buckets[self.today - timedelta(days=2)], Decimal("150.00"))
+        self.assertEqual(buckets[self.today - timedelta(days=1)], Decimal("100.00"))
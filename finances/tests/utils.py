@@ -0,0 +1,120 @@
+"""
+Test helpers
+"""
+
+# Standard Library
+from datetime import datetime, time
+from decimal import Decimal
+
+# Django
+from django.utils import timezone
+
+# Alliance Auth
+from allianceauth.eveonline.models import EveCorporationInfo
+from allianceauth.tests.auth_utils import AuthUtils
+
+# Corptools
+from corptools.models import (
+    CorporationAudit,
+    CorporationWalletDivision,
+    CorporationWalletJournalEntry,
+)
+
+
+def create_user_with_main_character(username: str, character_id: int):
+    """
+    Create a user with a main character, which the app urls require
+    :param username:
+    :type username:
+    :param character_id:
+    :type character_id:
+    :return:
+    :rtype:
+    """
+
+    user = AuthUtils.create_user(username)
+    AuthUtils.add_main_character_2(user, username, character_id)
+
+    return user
+
+
+def create_wallet_manager(username: str = "wallet_manager", character_id: int = 1001):
+    """
+    Create a user who can see the wallets of all corporations
+    :param username:
+    :type username:
+    :param character_id:
+    :type character_id:
+    :return:
+    :rtype:
+    """
+
+    user = create_user_with_main_character(username, character_id)
+
+    return AuthUtils.add_permission_to_user_by_name("corptools.global_corp_manager", user)
+
+
+def create_wallet_division(corporation_id: int = 2001, division: int = 1):
+    """
+    Create a corporation wallet division
+    :param corporation_id:
+    :type corporation_id:
+    :param division:
+    :type division:
+    :return:
+    :rtype:
+    """
+
+    corporation, _ = EveCorporationInfo.objects.get_or_create(
+        corporation_id=corporation_id,
+        defaults={
+            "corporation_name": f"Corporation {corporation_id}",
+            "corporation_ticker": str(corporation_id),
+            "member_count": 1,
+        },
+    )
+    audit, _ = CorporationAudit.objects.get_or_create(corporation=corporation)
+
+    return CorporationWalletDivision.objects.create(
+        corporation=audit, division=division, balance=Decimal("0.00")
+    )
+
+
+def create_journal_entry(division, date, amount, ref_type: str = "bounty_prizes", description: str = ""):
+    """
+    Create a corporation wallet journal entry
+    :param division:
+    :type division:
+    :param date:
+    :type date:
+    :param amount:
+    :type amount:
+    :param ref_type:
+    :type ref_type:
+    :param description:
+    :type description:
+    :return:
+    :rtype:
+    """
+
+    return CorporationWalletJournalEntry.objects.create(
+        division=division,
+        date=date,
+        amount=Decimal(amount),
+        balance=Decimal("0.00"),
+        description=description,
+        entry_id=CorporationWalletJournalEntry.objects.count() + 1,
+        ref_type=ref_type,
+    )
+
+
+def noon_of(day):
+    """
+    Midday of a day in the current timezone, clear of any day boundary
+    :param day:
+    :type day:
+    :return:
+    :rtype:
+    """
+
+    return timezone.make_aware(datetime.combine(day, time(12)), timezone.get_current_timezone())
@@ -10,4 +10,5 @@ app_name: str = "finances"  # pylint: disable=invalid-name
 
 urlpatterns = [
     path("", views.dashboard, name="dashboard"),
+    path("api/dashboard.json", views.dashboard_data, name="dashboard_data"),
 ]
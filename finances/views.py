@@ -4,15 +4,21 @@
 import csv
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from urllib.parse import urlencode
 
 # Django
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count, Q, Sum
-from django.db.models.functions import Coalesce, TruncDate
-from django.http import HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Max, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
 from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
 
 # Corptools
 from corptools.models import (
@@ -20,111 +26,209 @@ from corptools.models import (
     CorporationWalletJournalEntry,
 )
 
-WALLET_PERMISSIONS = (
-    "corptools.own_corp_manager",
-    "corptools.alliance_corp_manager",
-    "corptools.state_corp_manager",
-    "corptools.global_corp_manager",
-    "corptools.holding_corp_wallets",
+# AA allianceauth-corptools-finances
+from finances.app_settings import (
+    FINANCES_CACHE_TIMEOUT,
+    FINANCES_DASHBOARD_CACHE_TIMEOUT,
+    FINANCES_DRILLDOWN_MAX_ROWS,
+)
+from finances.cache import get_journal_versions, make_cache_key, make_digest
+from finances.models import CorporationWalletDailyTotal, CorporationWalletDailyTotalState
+from finances.templatetags.finances import ref_type_label
+
+WALLET_PERMISSIONS = frozenset(
+    (
+        "corptools.own_corp_manager",
+        "corptools.alliance_corp_manager",
+        "corptools.state_corp_manager",
+        "corptools.global_corp_manager",
+        "corptools.holding_corp_wallets",
+    )
 )
 
+# Columns the aggregates read, the drilldown replaces them with DRILLDOWN_FIELDS
+AGGREGATE_FIELDS = ("date", "division_id", "ref_type", "amount")
+
+DRILLDOWN_FIELDS = (
+    "date",
+    "entry_id",
+    "ref_type",
+    "amount",
+    "balance",
+    "first_party_id",
+    "second_party_id",
+    "context_id",
+    "context_id_type",
+    "description",
+    "reason",
+    "tax",
+    "tax_receiver_id",
+    "processed",
+    "division__division",
+    "division__name",
+    "division__corporation__corporation__corporation_name",
+    "first_party_name__name",
+    "first_party_name__category",
+    "second_party_name__name",
+    "second_party_name__category",
+)
 
-def _user_can_view_wallets(user) -> bool:
-    return any(user.has_perm(perm) for perm in WALLET_PERMISSIONS)
 
+def _user_can_view_wallets(request) -> bool:
+    # Checked by the conditional GET hooks and the view of the same request
+    if not hasattr(request, "_finances_can_view_wallets"):
+        user = request.user
+        request._finances_can_view_wallets = user.is_active and not (
+            WALLET_PERMISSIONS.isdisjoint(user.get_all_permissions())
+        )
 
-def _parse_int_list(values):
-    output = []
-    for value in values:
-        try:
-            output.append(int(value))
-        except (TypeError, ValueError):
-            continue
-    return output
+    return request._finances_can_view_wallets
+
+
+def _is_int(value: str) -> bool:
+    digits = value[1:] if value[:1] in ("+", "-") else value
+    return digits.isascii() and digits.isdigit()
 
 
-def _format_ref_type(ref_type: str) -> str:
-    return ref_type.replace("_", " ").title()
+def _parse_int_list(values):
+    return [int(value) for value in values if _is_int(value)]
 
 
 def _parse_date(value):
+    # Skip the exception path for the empty values submitted by the form
+    if not value or len(value) != 10 or value[4] != "-" or value[7] != "-":
+        return None
     try:
         return date.fromisoformat(value)
-    except (TypeError, ValueError):
+    except ValueError:
         return None
 
 
 def _clean_query_params(request, remove_keys):
-    params = request.GET.copy()
-    for key in remove_keys:
-        params.pop(key, None)
-    return params.urlencode()
+    remove_keys = set(remove_keys)
+    return urlencode(
+        [
+            (key, value)
+            for key, values in request.GET.lists()
+            if key not in remove_keys
+            for value in values
+        ]
+    )
+
+
+def _drill_row(entry) -> dict:
+    return {
+        "date": entry.date,
+        "entry_id": entry.entry_id,
+        "division": entry.division.division,
+        "division_name": entry.division.name or "",
+        "corp_name": entry.division.corporation.corporation.corporation_name,
+        "ref_type": entry.ref_type,
+        "amount": entry.amount,
+        "balance": entry.balance,
+        "first_party_id": entry.first_party_id,
+        "first_party_name": getattr(entry.first_party_name, "name", ""),
+        "first_party_category": getattr(entry.first_party_name, "category", ""),
+        "second_party_id": entry.second_party_id,
+        "second_party_name": getattr(entry.second_party_name, "name", ""),
+        "second_party_category": getattr(entry.second_party_name, "category", ""),
+        "context_id": entry.context_id,
+        "context_id_type": entry.context_id_type,
+        "description": entry.description,
+        "reason": entry.reason,
+        "tax": entry.tax,
+        "tax_receiver_id": entry.tax_receiver_id,
+        "processed": entry.processed,
+    }
+
+
+class _Echo:
+    """File-like object that hands written CSV lines straight back"""
+
+    def write(self, value):
+        return value
+
+
+def _iter_drill_rows(drill_qs):
+    for entry in drill_qs.iterator(chunk_size=2000):
+        yield _drill_row(entry)
 
 
 def _export_drilldown_csv(drill_qs, drill_title):
-    response = HttpResponse(content_type="text/csv")
     filename = "finances_drilldown.csv"
     if drill_title:
         safe_title = drill_title.lower().replace(" ", "_").replace(":", "")
         filename = f"finances_{safe_title}.csv"
-    response["Content-Disposition"] = f"attachment; filename={filename}"
-    writer = csv.writer(response)
-
-    writer.writerow(
-        [
-            "Date",
-            "Entry ID",
-            "Corporation",
-            "Division",
-            "Ref Type",
-            "Amount",
-            "Balance",
-            "First Party",
-            "First Party ID",
-            "First Party Category",
-            "Second Party",
-            "Second Party ID",
-            "Second Party Category",
-            "Context Type",
-            "Context ID",
-            "Description",
-            "Reason",
-            "Tax",
-            "Tax Receiver",
-            "Processed",
-        ]
-    )
+    writer = csv.writer(_Echo())
 
-    for entry in drill_qs:
-        writer.writerow(
+    def _csv_lines():
+        yield writer.writerow(
             [
-                entry.date.isoformat(),
-                entry.entry_id,
-                entry.division.corporation.corporation.corporation_name,
-                f"{entry.division.division} {entry.division.name or ''}".strip(),
-                entry.ref_type,
-                entry.amount,
-                entry.balance,
-                getattr(entry.first_party_name, "name", ""),
-                entry.first_party_id,
-                getattr(entry.first_party_name, "category", ""),
-                getattr(entry.second_party_name, "name", ""),
-                entry.second_party_id,
-                getattr(entry.second_party_name, "category", ""),
-                entry.context_id_type,
-                entry.context_id,
-                entry.description,
-                entry.reason,
-                entry.tax,
-                entry.tax_receiver_id,
-                entry.processed,
+                "Date",
+                "Entry ID",
+                "Corporation",
+                "Division",
+                "Ref Type",
+                "Amount",
+                "Balance",
+                "First Party",
+                "First Party ID",
+                "First Party Category",
+                "Second Party",
+                "Second Party ID",
+                "Second Party Category",
+                "Context Type",
+                "Context ID",
+                "Description",
+                "Reason",
+                "Tax",
+                "Tax Receiver",
+                "Processed",
             ]
         )
 
+        for row in _iter_drill_rows(drill_qs):
+            yield writer.writerow(
+                [
+                    row["date"].isoformat(),
+                    row["entry_id"],
+                    row["corp_name"],
+                    f"{row['division']} {row['division_name']}".strip(),
+                    row["ref_type"],
+                    row["amount"],
+                    row["balance"],
+                    row["first_party_name"],
+                    row["first_party_id"],
+                    row["first_party_category"],
+                    row["second_party_name"],
+                    row["second_party_id"],
+                    row["second_party_category"],
+                    row["context_id_type"],
+                    row["context_id"],
+                    row["description"],
+                    row["reason"],
+                    row["tax"],
+                    row["tax_receiver_id"],
+                    row["processed"],
+                ]
+            )
+
+    response = StreamingHttpResponse(_csv_lines(), content_type="text/csv")
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+
     return response
 
 
+def _to_cents(amount) -> int:
+    return int(amount.scaleb(2).to_integral_value())
+
+
+def _from_cents(cents) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
 def _series_stats(values, start_day):
+    # values are integer cents, the stats are handed to the template as Decimal
     if not values:
         return {
             "total": Decimal("0.00"),
@@ -135,94 +239,67 @@ def _series_stats(values, start_day):
             "days": 0,
         }
 
-    total = sum(values, Decimal("0.00"))
+    total = 0
+    max_value = values[0]
+    max_index = 0
+    active_days = 0
+    for index, value in enumerate(values):
+        total += value
+        if value > max_value:
+            max_value = value
+            max_index = index
+        if value > 0:
+            active_days += 1
+
     days = len(values)
-    avg = total / days if days else Decimal("0.00")
-    max_value = max(values)
-    max_index = values.index(max_value)
     max_date = start_day + timedelta(days=max_index) if max_value > 0 else None
-    active_days = sum(1 for value in values if value > 0)
 
     return {
-        "total": total,
-        "avg": avg,
-        "max": max_value,
+        "total": _from_cents(total),
+        "avg": (Decimal(total) / days).scaleb(-2),
+        "max": _from_cents(max_value),
         "max_date": max_date,
         "active_days": active_days,
         "days": days,
     }
 
 
-def _build_daily_series(entries, start_date, end_date, abs_values=False):
-    series = list(
-        entries.annotate(day=TruncDate("date"))
-        .values("day")
-        .annotate(total=Coalesce(Sum("amount"), Decimal("0.00")))
-        .order_by("day")
-    )
-    totals_by_day = {row["day"]: row["total"] for row in series}
+def _window_days(start_date, end_date):
+    start_day = start_date.date()
+    days_count = (end_date.date() - start_day).days
+    days = [start_day + timedelta(days=offset) for offset in range(days_count + 1)]
 
-    days_count = (end_date.date() - start_date.date()).days
+    return [(day, day.isoformat()) for day in days]
+
+
+def _densify_daily_series(totals_by_day, window_days, abs_values=False):
     values = []
     points = []
-    for offset in range(days_count + 1):
-        day = start_date.date() + timedelta(days=offset)
-        total = totals_by_day.get(day, Decimal("0.00"))
+    for day, day_iso in window_days:
+        total = totals_by_day.get(day, 0)
         if abs_values:
             total = abs(total)
         values.append(total)
-        points.append(
-            {
-                "date": day.isoformat(),
-                "total": float(total),
-            }
-        )
+        points.append({"date": day_iso, "total": total / 100})
 
-    stats = _series_stats(values, start_date.date())
+    stats = _series_stats(values, window_days[0][0] if window_days else None)
 
     return points, stats
 
 
-def _build_series_by_ref(entries, ref_types, start_date, end_date, abs_values=False):
-    if not ref_types:
-        return []
-
-    series_rows = (
-        entries.filter(ref_type__in=ref_types)
-        .annotate(day=TruncDate("date"))
-        .values("day", "ref_type")
-        .annotate(total=Coalesce(Sum("amount"), Decimal("0.00")))
-        .order_by("day")
-    )
-
-    totals_by_ref = {ref_type: {} for ref_type in ref_types}
-    for row in series_rows:
-        total = row["total"]
-        if abs_values:
-            total = abs(total)
-        totals_by_ref[row["ref_type"]][row["day"]] = total
-
-    days_count = (end_date.date() - start_date.date()).days
+def _densify_series_by_ref(totals_by_ref, ref_types, window_days):
     output = []
-
     for ref_type in ref_types:
-        points = []
-        total_sum = Decimal("0.00")
-        for offset in range(days_count + 1):
-            day = start_date.date() + timedelta(days=offset)
-            value = totals_by_ref.get(ref_type, {}).get(day, Decimal("0.00"))
-            total_sum += value
-            points.append(
-                {
-                    "date": day.isoformat(),
-                    "total": float(value),
-                }
-            )
+        totals_by_day = totals_by_ref.get(ref_type, {})
+        points = [
+            {"date": day_iso, "total": totals_by_day.get(day, 0) / 100}
+            for day, day_iso in window_days
+        ]
         output.append(
             {
                 "key": ref_type,
-                "label": _format_ref_type(ref_type),
-                "total": float(total_sum),
+                "label": ref_type_label(ref_type),
+                "total": sum(point["total"] for point in points),
                 "points": points,
             }
         )
@@ -230,10 +307,196 @@ def _build_series_by_ref(entries, ref_types, start_date, end_date, abs_values=Fa
     return output
 
 
-@login_required
-def dashboard(request) -> HttpResponse:
-    if not _user_can_view_wallets(request.user):
-        raise PermissionDenied("No permission to view corporation wallet data.")
+def _build_income_expense_series(
+    buckets,
+    selected_ref_types,
+    selected_expense_ref_types,
+    income_ref_types,
+    expense_ref_types,
+    window_days,
+) -> dict:
+    # The daily buckets feed the daily totals and the by-ref breakouts.
+    # Sum in integer cents, Decimal arithmetic is far slower than int.
+    selected_income = set(selected_ref_types)
+    selected_expenses = set(selected_expense_ref_types)
+    income_by_day = {}
+    expenses_by_day = {}
+    income_by_ref = {}
+    expenses_by_ref = {}
+    for row in buckets:
+        day = row["day"]
+        ref_type = row["ref_type"]
+        if row["income_count"] and ref_type in selected_income:
+            income = _to_cents(row["income"])
+            income_by_day[day] = income_by_day.get(day, 0) + income
+            by_ref = income_by_ref.setdefault(ref_type, {})
+            by_ref[day] = by_ref.get(day, 0) + income
+        if row["expense_count"] and ref_type in selected_expenses:
+            expenses = _to_cents(row["expenses"])
+            expenses_by_day[day] = expenses_by_day.get(day, 0) + expenses
+            by_ref = expenses_by_ref.setdefault(ref_type, {})
+            by_ref[day] = by_ref.get(day, 0) - expenses
+
+    income_points, income_stats = _densify_daily_series(income_by_day, window_days)
+    expense_points, expense_stats = _densify_daily_series(
+        expenses_by_day, window_days, abs_values=True
+    )
+
+    return {
+        "income_series": income_points,
+        "income_series_by_ref": _densify_series_by_ref(
+            income_by_ref, income_ref_types, window_days
+        ),
+        "income_stats": income_stats,
+        "expense_series": expense_points,
+        "expense_series_by_ref": _densify_series_by_ref(
+            expenses_by_ref, expense_ref_types, window_days
+        ),
+        "expense_stats": expense_stats,
+    }
+
+
+def _empty_context(filters):
+    zero = Decimal("0.00")
+    stats = _series_stats(
+        [0] * len(_window_days(filters["start_date"], filters["end_date"])),
+        filters["start_date"].date(),
+    )
+
+    return {
+        "days": filters["days"],
+        "days_options": filters["days_options"],
+        "start_date": filters["start_date"],
+        "end_date": filters["end_date"],
+        "custom_start_value": filters["custom_start_value"],
+        "custom_end_value": filters["custom_end_value"],
+        "division_rows": [],
+        "division_ids": set(),
+        "divisions": [],
+        "ref_type_choices": [],
+        "selected_ref_types": set(),
+        "expense_ref_type_choices": [],
+        "selected_expense_ref_types": set(),
+        "summary": {
+            "income_total": zero,
+            "expense_total": zero,
+            "expense_total_abs": zero,
+            "net_total": zero,
+            "entry_count": 0,
+            "income_count": 0,
+            "expense_count": 0,
+        },
+        "income_by_ref": [],
+        "expense_by_ref": [],
+        "income_series": [],
+        "expense_series": [],
+        "series_url": "",
+        "income_stats": stats,
+        "expense_stats": stats,
+        "drilldown": None,
+    }
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def _journal_buckets(filters) -> list:
+    """Daily totals per division and ref type of the selected window"""
+
+    # Shared by the ref type options and the context of the same request
+    if "buckets" in filters:
+        return filters["buckets"]
+
+    start_date = filters["start_date"]
+    end_date = filters["end_date"]
+    totals_state = filters["journal_state"]["totals"]
+    buckets = []
+    live_entries = filters["entries"]
+
+    # Days up to the last run of update_daily_totals come from the
+    # precomputed totals, only the days after it are grouped from the journal
+    if totals_state and totals_state["synced_through"] >= start_date.date():
+        synced_through = totals_state["synced_through"]
+        buckets.extend(
+            CorporationWalletDailyTotal.objects.filter(
+                division_id__in=filters["division_ids"],
+                date__gte=start_date.date(),
+                date__lte=min(end_date.date(), synced_through),
+            ).values(
+                "division_id",
+                "ref_type",
+                "income",
+                "expenses",
+                "income_count",
+                "expense_count",
+                "entry_count",
+                day=F("date"),
+            )
+        )
+        # Entries imported after the run are not in the totals, even when
+        # they belong to a day the totals already cover
+        live_entries = live_entries.filter(
+            Q(date__gte=_start_of_day(synced_through + timedelta(days=1)))
+            | Q(id__gt=totals_state["last_entry_id"])
+        )
+
+    buckets.extend(CorporationWalletDailyTotal.objects.journal_totals(live_entries))
+
+    filters["buckets"] = buckets
+
+    return buckets
+
+
+def _fold_ref_type_totals(buckets) -> list:
+    totals = {}
+    for row in buckets:
+        ref_totals = totals.get(row["ref_type"])
+        if ref_totals is None:
+            ref_totals = totals[row["ref_type"]] = [0, 0, 0, 0, 0]
+        ref_totals[0] += _to_cents(row["income"])
+        ref_totals[1] += _to_cents(row["expenses"])
+        ref_totals[2] += row["income_count"]
+        ref_totals[3] += row["expense_count"]
+        ref_totals[4] += row["entry_count"]
+
+    return [
+        {
+            "ref_type": ref_type,
+            "income": _from_cents(income),
+            "expenses": _from_cents(expenses),
+            "income_count": income_count,
+            "expense_count": expense_count,
+            "entry_count": entry_count,
+        }
+        for ref_type, (income, expenses, income_count, expense_count, entry_count) in sorted(
+            totals.items()
+        )
+    ]
+
+
+def _ref_type_totals(filters):
+    # The per ref type totals of the window feed the filter options, the
+    # per ref type tables and the summary totals/counts.
+    division_ids = sorted(filters["division_ids"])
+    cache_key = make_cache_key(
+        "ref-types",
+        division_ids,
+        get_journal_versions(division_ids),
+        filters["journal_state"]["watermark"],
+        filters["start_date"].date().isoformat(),
+        filters["end_date"].date().isoformat(),
+    )
+
+    return cache.get_or_set(
+        cache_key,
+        lambda: _fold_ref_type_totals(_journal_buckets(filters)),
+        FINANCES_CACHE_TIMEOUT,
+    )
+
+
+def _dashboard_filters(request) -> dict:
+    """Resolve the window, divisions and ref types selected in the query string"""
 
     days_options = [7, 30, 60, 90, 180, 365]
     try:
@@ -244,8 +507,10 @@ def dashboard(request) -> HttpResponse:
     if days not in days_options:
         days = 30
 
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=days)
+    # Windows cover whole days in the current timezone, like the daily totals
+    now = timezone.localtime()
+    end_date = now
+    start_date = _start_of_day(now.date() - timedelta(days=days))
     custom_start = _parse_date(request.GET.get("start_date"))
     custom_end = _parse_date(request.GET.get("end_date"))
     if custom_start or custom_end:
@@ -255,153 +520,279 @@ def dashboard(request) -> HttpResponse:
             custom_end = custom_start
         if custom_start > custom_end:
             custom_start, custom_end = custom_end, custom_start
-        tz = timezone.get_current_timezone()
-        start_date = timezone.make_aware(datetime.combine(custom_start, time.min), tz)
-        end_date = timezone.make_aware(datetime.combine(custom_end, time.max), tz)
-        now = timezone.now()
+        # Days in the future have no journal, clamp them to today
+        custom_start = min(custom_start, now.date())
+        custom_end = min(custom_end, now.date())
+        start_date = _start_of_day(custom_start)
+        end_date = timezone.make_aware(
+            datetime.combine(custom_end, time.max), timezone.get_current_timezone()
+        )
         if end_date > now:
             end_date = now
 
-    all_divisions = (
+    all_divisions = list(
         CorporationWalletDivision.get_visible(request.user)
-        .select_related("corporation__corporation")
         .order_by("corporation__corporation__corporation_name", "division")
+        .values(
+            "id",
+            "division",
+            "name",
+            "balance",
+            corp_name=F("corporation__corporation__corporation_name"),
+        )
     )
 
-    selected_divisions = _parse_int_list(request.GET.getlist("divisions"))
-    if selected_divisions:
-        selected_divisions_qs = all_divisions.filter(id__in=selected_divisions)
-    else:
-        selected_divisions_qs = all_divisions
+    selected_divisions = set(_parse_int_list(request.GET.getlist("divisions")))
+    division_ids = [
+        division["id"] for division in all_divisions if division["id"] in selected_divisions
+    ]
+    if not division_ids:
+        division_ids = [division["id"] for division in all_divisions]
 
-    division_ids = list(selected_divisions_qs.values_list("id", flat=True))
+    filters = {
+        "days": days,
+        "days_options": days_options,
+        "start_date": start_date,
+        "end_date": end_date,
+        "custom_start_value": custom_start.isoformat() if custom_start else "",
+        "custom_end_value": custom_end.isoformat() if custom_end else "",
+        "all_divisions": all_divisions,
+        "division_ids": division_ids,
+        "journal_state": _journal_state(request),
+    }
     if not division_ids:
-        selected_divisions_qs = all_divisions
-        division_ids = list(all_divisions.values_list("id", flat=True))
+        return filters
 
-    entries = CorporationWalletJournalEntry.get_visible(request.user).filter(
+    # division_ids only holds divisions visible to the user, so the journal
+    # does not need its own get_visible() permission join.
+    entries = CorporationWalletJournalEntry.objects.filter(
         date__gte=start_date,
         date__lte=end_date,
         division_id__in=division_ids,
-    )
+    ).only(*AGGREGATE_FIELDS)
 
-    ref_type_options = list(
-        entries.filter(amount__gt=0)
-        .values_list("ref_type", flat=True)
-        .distinct()
-        .order_by("ref_type")
-    )
-    ref_type_choices = [
-        {"value": ref_type, "label": _format_ref_type(ref_type)}
-        for ref_type in ref_type_options
-    ]
+    filters["entries"] = entries
+    ref_type_totals = _ref_type_totals(filters)
 
-    selected_ref_types = request.GET.getlist("ref_types")
-    if selected_ref_types:
-        selected_ref_types = [ref for ref in selected_ref_types if ref in ref_type_options]
+    # Options keep the display order, the frozensets back the membership tests
+    ref_type_options = [row["ref_type"] for row in ref_type_totals if row["income_count"]]
+    ref_type_option_set = frozenset(ref_type_options)
+    selected_ref_types = [
+        ref for ref in request.GET.getlist("ref_types") if ref in ref_type_option_set
+    ]
     if not selected_ref_types:
         selected_ref_types = ref_type_options
 
-    expense_ref_type_options = list(
-        entries.filter(amount__lt=0)
-        .values_list("ref_type", flat=True)
-        .distinct()
-        .order_by("ref_type")
-    )
-    expense_ref_type_choices = [
-        {"value": ref_type, "label": _format_ref_type(ref_type)}
-        for ref_type in expense_ref_type_options
+    expense_ref_type_options = [
+        row["ref_type"] for row in ref_type_totals if row["expense_count"]
+    ]
+    expense_ref_type_option_set = frozenset(expense_ref_type_options)
+    selected_expense_ref_types = [
+        ref
+        for ref in request.GET.getlist("expense_ref_types")
+        if ref in expense_ref_type_option_set
     ]
-
-    selected_expense_ref_types = request.GET.getlist("expense_ref_types")
-    if selected_expense_ref_types:
-        selected_expense_ref_types = [
-            ref for ref in selected_expense_ref_types if ref in expense_ref_type_options
-        ]
     if not selected_expense_ref_types:
         selected_expense_ref_types = expense_ref_type_options
 
-    income_entries = entries.filter(amount__gt=0)
-    if selected_ref_types:
-        income_entries = income_entries.filter(ref_type__in=selected_ref_types)
-
-    expense_entries = entries.filter(amount__lt=0)
-    if selected_expense_ref_types:
-        expense_entries = expense_entries.filter(ref_type__in=selected_expense_ref_types)
-
-    income_total = income_entries.aggregate(
-        total=Coalesce(Sum("amount"), Decimal("0.00"))
-    )["total"]
-    expense_total = expense_entries.aggregate(
-        total=Coalesce(Sum("amount"), Decimal("0.00"))
-    )["total"]
-
-    income_by_ref = list(
-        income_entries.values("ref_type")
-        .annotate(total=Coalesce(Sum("amount"), Decimal("0.00")), count=Count("id"))
-        .order_by("-total")
+    filters.update(
+        {
+            "ref_type_totals": ref_type_totals,
+            "ref_type_options": ref_type_options,
+            "expense_ref_type_options": expense_ref_type_options,
+            "selected_ref_types": selected_ref_types,
+            "selected_expense_ref_types": selected_expense_ref_types,
+        }
     )
-    for row in income_by_ref:
-        row["label"] = _format_ref_type(row["ref_type"])
 
-    expense_by_ref = list(
-        expense_entries.values("ref_type")
-        .annotate(total=Coalesce(Sum("amount"), Decimal("0.00")), count=Count("id"))
-        .order_by("total")
-    )
-    for row in expense_by_ref:
-        row["label"] = _format_ref_type(row["ref_type"])
-        row["total_abs"] = abs(row["total"])
+    return filters
+
+
+def _journal_state(request) -> dict:
+    # Shared by the ETag and the cache keys of the same request. The highest
+    # id moves on every import, bulk_create included, which the post_save
+    # version bumps never see. It is read from the plain table so the primary
+    # key answers it, without the visibility joins of get_visible(). The daily
+    # totals state moves on every run of update_daily_totals, which rewrites
+    # closed days without a new journal id, e.g. after deletes.
+    if not hasattr(request, "_finances_journal_state"):
+        state = {"last_id": None, "totals": None}
+        if _user_can_view_wallets(request):
+            state = CorporationWalletJournalEntry.objects.aggregate(last_id=Max("id"))
+            state["totals"] = (
+                CorporationWalletDailyTotalState.objects.filter(pk=1)
+                .values("synced_through", "last_entry_id", "updated")
+                .first()
+            )
+        totals_updated = state["totals"]["updated"].isoformat() if state["totals"] else None
+        state["watermark"] = (state["last_id"], totals_updated)
+        request._finances_journal_state = state
 
-    income_series_points, income_stats = _build_daily_series(
-        income_entries, start_date, end_date
-    )
-    income_series_by_ref = _build_series_by_ref(
-        income_entries, selected_ref_types, start_date, end_date
-    )
-    expense_series_points, expense_stats = _build_daily_series(
-        expense_entries, start_date, end_date, abs_values=True
+    return request._finances_journal_state
+
+
+def _dashboard_etag(request, *args, **kwargs):
+    state = _journal_state(request)
+    if state["last_id"] is None:
+        return None
+
+    # The current day is part of the tag so rolling windows still move on
+    return make_digest(
+        request.path,
+        request.user.pk,
+        sorted(request.GET.lists()),
+        state["watermark"],
+        timezone.localdate().isoformat(),
     )
-    expense_series_by_ref = _build_series_by_ref(
-        expense_entries, selected_expense_ref_types, start_date, end_date, abs_values=True
+
+
+def _dashboard_context(filters) -> dict:
+    """Aggregate the journal for the dashboard, without the drilldown"""
+
+    buckets = _journal_buckets(filters)
+    ref_type_totals = filters["ref_type_totals"]
+    selected_ref_types = set(filters["selected_ref_types"])
+    selected_expense_ref_types = set(filters["selected_expense_ref_types"])
+    division_id_set = set(filters["division_ids"])
+    ref_labels = {row["ref_type"]: ref_type_label(row["ref_type"]) for row in ref_type_totals}
+
+    income_by_ref = []
+    expense_by_ref = []
+    for row in ref_type_totals:
+        if row["ref_type"] in selected_ref_types and row["income_count"]:
+            income_by_ref.append(
+                {
+                    "ref_type": row["ref_type"],
+                    "total": row["income"],
+                    "count": row["income_count"],
+                }
+            )
+        if row["ref_type"] in selected_expense_ref_types and row["expense_count"]:
+            expense_by_ref.append(
+                {
+                    "ref_type": row["ref_type"],
+                    "total": row["expenses"],
+                    "total_abs": abs(row["expenses"]),
+                    "count": row["expense_count"],
+                }
+            )
+    income_by_ref.sort(key=lambda row: row["total"], reverse=True)
+    expense_by_ref.sort(key=lambda row: row["total"])
+
+    income_total = sum((row["total"] for row in income_by_ref), Decimal("0.00"))
+    expense_total = sum((row["total"] for row in expense_by_ref), Decimal("0.00"))
+
+    # The ref type breakouts are fetched by the charts from dashboard_data
+    series = _build_income_expense_series(
+        buckets,
+        selected_ref_types,
+        selected_expense_ref_types,
+        [],
+        [],
+        _window_days(filters["start_date"], filters["end_date"]),
     )
 
-    division_totals = {
-        row["division_id"]: row
-        for row in entries.values(
-            "division_id",
-            "division__division",
-            "division__name",
-            "division__corporation__corporation__corporation_name",
-        ).annotate(
-            income=Coalesce(
-                Sum("amount", filter=Q(amount__gt=0, ref_type__in=selected_ref_types)),
-                Decimal("0.00"),
-            ),
-            expenses=Coalesce(
-                Sum("amount", filter=Q(amount__lt=0, ref_type__in=selected_expense_ref_types)),
-                Decimal("0.00"),
-            ),
-        )
+    # Divisions without journal entries keep their zero totals, the table
+    # doubles as a balance overview. Totals are summed in cents first.
+    divisions_by_id = {
+        division["id"]: {
+            "corp_name": division["corp_name"],
+            "division": division["division"],
+            "name": division["name"] or "",
+            "balance": division["balance"],
+            "income": 0,
+            "expenses": 0,
+            "division_id": division["id"],
+        }
+        for division in filters["all_divisions"]
+        if division["id"] in division_id_set
     }
+    for row in buckets:
+        division = divisions_by_id[row["division_id"]]
+        if row["income_count"] and row["ref_type"] in selected_ref_types:
+            division["income"] += _to_cents(row["income"])
+        if row["expense_count"] and row["ref_type"] in selected_expense_ref_types:
+            division["expenses"] += _to_cents(row["expenses"])
+    division_rows = list(divisions_by_id.values())
+    for division in division_rows:
+        division["net"] = _from_cents(division["income"] + division["expenses"])
+        division["income"] = _from_cents(division["income"])
+        division["expenses"] = _from_cents(division["expenses"])
 
-    division_rows = []
-    for division in selected_divisions_qs:
-        totals = division_totals.get(division.id, {})
-        income = totals.get("income", Decimal("0.00"))
-        expenses = totals.get("expenses", Decimal("0.00"))
-        division_rows.append(
-            {
-                "corp_name": division.corporation.corporation.corporation_name,
-                "division": division.division,
-                "name": division.name or "",
-                "balance": division.balance,
-                "income": income,
-                "expenses": expenses,
-                "net": income + expenses,
-                "division_id": division.id,
-            }
-        )
+    return {
+        "days": filters["days"],
+        "days_options": filters["days_options"],
+        "start_date": filters["start_date"],
+        "end_date": filters["end_date"],
+        "custom_start_value": filters["custom_start_value"],
+        "custom_end_value": filters["custom_end_value"],
+        "division_rows": division_rows,
+        "division_ids": division_id_set,
+        "divisions": filters["all_divisions"],
+        "ref_type_choices": [
+            {"value": ref_type, "label": ref_labels[ref_type]}
+            for ref_type in filters["ref_type_options"]
+        ],
+        "selected_ref_types": selected_ref_types,
+        "expense_ref_type_choices": [
+            {"value": ref_type, "label": ref_labels[ref_type]}
+            for ref_type in filters["expense_ref_type_options"]
+        ],
+        "selected_expense_ref_types": selected_expense_ref_types,
+        "summary": {
+            "income_total": income_total,
+            "expense_total": expense_total,
+            "expense_total_abs": abs(expense_total),
+            "net_total": income_total + expense_total,
+            "entry_count": sum(row["entry_count"] for row in ref_type_totals),
+            "income_count": sum(row["count"] for row in income_by_ref),
+            "expense_count": sum(row["count"] for row in expense_by_ref),
+        },
+        "income_by_ref": income_by_ref,
+        "expense_by_ref": expense_by_ref,
+        "income_series": series["income_series"],
+        "expense_series": series["expense_series"],
+        "income_stats": series["income_stats"],
+        "expense_stats": series["expense_stats"],
+    }
+
+
+@login_required
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_dashboard_etag)
+def dashboard(request) -> HttpResponse:
+    if not _user_can_view_wallets(request):
+        raise PermissionDenied("No permission to view corporation wallet data.")
+
+    filters = _dashboard_filters(request)
+    if not filters["division_ids"]:
+        # Nothing visible to this user, skip the journal queries entirely
+        return render(request, "finances/index.html", _empty_context(filters))
+
+    entries = filters["entries"]
+    selected_ref_types = filters["selected_ref_types"]
+    selected_expense_ref_types = filters["selected_expense_ref_types"]
+    division_ids = sorted(filters["division_ids"])
+    cache_key = make_cache_key(
+        "dashboard",
+        request.user.pk,
+        filters["days"],
+        filters["custom_start_value"],
+        filters["custom_end_value"],
+        filters["start_date"].date().isoformat(),
+        filters["end_date"].date().isoformat(),
+        division_ids,
+        get_journal_versions(division_ids),
+        filters["journal_state"]["watermark"],
+        selected_ref_types,
+        selected_expense_ref_types,
+    )
+    context = cache.get_or_set(
+        cache_key,
+        lambda: _dashboard_context(filters),
+        FINANCES_DASHBOARD_CACHE_TIMEOUT,
+    )
 
     drilldown = None
     drill_type = request.GET.get("drill")
@@ -413,22 +804,23 @@ def dashboard(request) -> HttpResponse:
                 "first_party_name",
                 "second_party_name",
             )
+            .only(*DRILLDOWN_FIELDS)
             .order_by("-date")
         )
         drill_title = ""
 
         if drill_type == "income_ref":
             ref_type = request.GET.get("ref_type", "")
-            if ref_type in selected_ref_types:
+            if ref_type in context["selected_ref_types"]:
                 drill_qs = drill_qs.filter(amount__gt=0, ref_type=ref_type)
-                drill_title = f"Income: {_format_ref_type(ref_type)}"
+                drill_title = f"Income: {ref_type_label(ref_type)}"
             else:
                 drill_qs = drill_qs.none()
         elif drill_type == "expense_ref":
             ref_type = request.GET.get("ref_type", "")
-            if ref_type in selected_expense_ref_types:
+            if ref_type in context["selected_expense_ref_types"]:
                 drill_qs = drill_qs.filter(amount__lt=0, ref_type=ref_type)
-                drill_title = f"Expenses: {_format_ref_type(ref_type)}"
+                drill_title = f"Expenses: {ref_type_label(ref_type)}"
             else:
                 drill_qs = drill_qs.none()
         elif drill_type == "division":
@@ -437,13 +829,13 @@ def dashboard(request) -> HttpResponse:
             except (TypeError, ValueError):
                 division_id = None
 
-            if division_id and division_id in division_ids:
+            if division_id and division_id in context["division_ids"]:
                 drill_qs = drill_qs.filter(division_id=division_id).filter(
                     Q(amount__gt=0, ref_type__in=selected_ref_types)
                     | Q(amount__lt=0, ref_type__in=selected_expense_ref_types)
                 )
                 division_match = next(
-                    (row for row in division_rows if row["division_id"] == division_id),
+                    (row for row in context["division_rows"] if row["division_id"] == division_id),
                     None,
                 )
                 if division_match:
@@ -459,33 +851,7 @@ def dashboard(request) -> HttpResponse:
         if request.GET.get("export") == "csv":
             return _export_drilldown_csv(drill_qs, drill_title)
 
-        drill_rows = []
-        for entry in drill_qs:
-            drill_rows.append(
-                {
-                    "date": entry.date,
-                    "entry_id": entry.entry_id,
-                    "division": entry.division.division,
-                    "division_name": entry.division.name or "",
-                    "corp_name": entry.division.corporation.corporation.corporation_name,
-                    "ref_type": entry.ref_type,
-                    "amount": entry.amount,
-                    "balance": entry.balance,
-                    "first_party_id": entry.first_party_id,
-                    "first_party_name": getattr(entry.first_party_name, "name", ""),
-                    "first_party_category": getattr(entry.first_party_name, "category", ""),
-                    "second_party_id": entry.second_party_id,
-                    "second_party_name": getattr(entry.second_party_name, "name", ""),
-                    "second_party_category": getattr(entry.second_party_name, "category", ""),
-                    "context_id": entry.context_id,
-                    "context_id_type": entry.context_id_type,
-                    "description": entry.description,
-                    "reason": entry.reason,
-                    "tax": entry.tax,
-                    "tax_receiver_id": entry.tax_receiver_id,
-                    "processed": entry.processed,
-                }
-            )
+        drill_count = drill_qs.count()
 
         clear_query = _clean_query_params(
             request,
@@ -502,44 +868,51 @@ def dashboard(request) -> HttpResponse:
 
         drilldown = {
             "title": drill_title,
-            "rows": drill_rows,
-            "count": len(drill_rows),
+            "rows": _iter_drill_rows(drill_qs[:FINANCES_DRILLDOWN_MAX_ROWS]),
+            "count": drill_count,
+            "limit": FINANCES_DRILLDOWN_MAX_ROWS,
             "clear_query": clear_query,
             "export_query": export_params.urlencode(),
         }
 
+    series_query = _clean_query_params(request, ["drill", "ref_type", "division_id", "export"])
     context = {
-        "days": days,
-        "days_options": days_options,
-        "start_date": start_date,
-        "end_date": end_date,
-        "custom_start_value": custom_start.isoformat() if custom_start else "",
-        "custom_end_value": custom_end.isoformat() if custom_end else "",
-        "division_rows": division_rows,
-        "division_ids": set(division_ids),
-        "divisions": all_divisions,
-        "ref_type_choices": ref_type_choices,
-        "selected_ref_types": set(selected_ref_types),
-        "expense_ref_type_choices": expense_ref_type_choices,
-        "selected_expense_ref_types": set(selected_expense_ref_types),
-        "summary": {
-            "income_total": income_total,
-            "expense_total": expense_total,
-            "expense_total_abs": abs(expense_total),
-            "net_total": income_total + expense_total,
-            "entry_count": entries.count(),
-            "income_count": income_entries.count(),
-            "expense_count": expense_entries.count(),
-        },
-        "income_by_ref": income_by_ref,
-        "expense_by_ref": expense_by_ref,
-        "income_series": income_series_points,
-        "income_series_by_ref": income_series_by_ref,
-        "expense_series": expense_series_points,
-        "expense_series_by_ref": expense_series_by_ref,
-        "income_stats": income_stats,
-        "expense_stats": expense_stats,
+        **context,
+        "series_url": f"{reverse('finances:dashboard_data')}?{series_query}",
         "drilldown": drilldown,
     }
 
     return render(request, "finances/index.html", context)
+
+
+@login_required
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_dashboard_etag)
+def dashboard_data(request) -> JsonResponse:
+    """Chart series of the dashboard, including the ref type breakouts"""
+
+    if not _user_can_view_wallets(request):
+        raise PermissionDenied("No permission to view corporation wallet data.")
+
+    filters = _dashboard_filters(request)
+    if not filters["division_ids"]:
+        return JsonResponse(
+            {
+                "income_series": [],
+                "income_series_by_ref": [],
+                "expense_series": [],
+                "expense_series_by_ref": [],
+            }
+        )
+
+    series = _build_income_expense_series(
+        _journal_buckets(filters),
+        filters["selected_ref_types"],
+        filters["selected_expense_ref_types"],
+        filters["selected_ref_types"],
+        filters["selected_expense_ref_types"],
+        _window_days(filters["start_date"], filters["end_date"]),
+    )
+
+    return JsonResponse(series, encoder=DjangoJSONEncoder)
@@ -62,6 +62,7 @@ NOTIFICATIONS_MAX_PER_USER = 50
 
 # Add any additional apps to this list.
 INSTALLED_APPS += [
+    "corptools",
     PACKAGE,
 ]
 